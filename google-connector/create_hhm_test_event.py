@@ -1,27 +1,23 @@
 from datetime import datetime, timedelta
 
-from googleapiclient.discovery import build
-
-from main import get_credentials, FAMILY_CAL_ID, PRIMARY_CAL_ID
+from main import get_service, FAMILY_CAL_ID, LOCAL_TZ, PRIMARY_CAL_ID
 
 # Create a single test event tomorrow from 10:00 to 10:30 local time
 
 
 def main():
-    creds = get_credentials()
-    service = build("calendar", "v3", credentials=creds)
+    service = get_service("calendar", "v3")
 
     # Determine "tomorrow" in local time
-    now = datetime.now()
+    now = datetime.now(LOCAL_TZ)
     tomorrow = now.date() + timedelta(days=1)
 
-    start_dt = datetime(tomorrow.year, tomorrow.month, tomorrow.day, 10, 0, 0)
-    end_dt = datetime(tomorrow.year, tomorrow.month, tomorrow.day, 10, 30, 0)
+    start_dt = datetime(tomorrow.year, tomorrow.month, tomorrow.day, 10, 0, 0, tzinfo=LOCAL_TZ)
+    end_dt = datetime(tomorrow.year, tomorrow.month, tomorrow.day, 10, 30, 0, tzinfo=LOCAL_TZ)
 
-    # RFC3339 with explicit offset; assume local is Pacific (America/Los_Angeles, -08:00 winter)
-    # For a quick test we hardcode -08:00; you can refine to use pytz/zoneinfo later.
-    start_str = start_dt.strftime("%Y-%m-%dT%H:%M:%S-08:00")
-    end_str = end_dt.strftime("%Y-%m-%dT%H:%M:%S-08:00")
+    # RFC3339 with the correct Pacific offset (PST or PDT) for that date
+    start_str = start_dt.isoformat()
+    end_str = end_dt.isoformat()
 
     event_body = {
         "summary": "HHM Test Event",
@@ -1,6 +1,4 @@
-from googleapiclient.discovery import build
-
-from main import get_credentials, FAMILY_CAL_ID, PRIMARY_CAL_ID
+from main import get_service, FAMILY_CAL_ID, PRIMARY_CAL_ID
 
 # Deletes the previously created HHM Test Event by id.
 # If you ever recreate it with a different id, update EVENT_ID below.
@@ -9,8 +7,7 @@ EVENT_ID = "13uqc1kgql6aef44oghbe18kd4"
 
 
 def main():
-    creds = get_credentials()
-    service = build("calendar", "v3", credentials=creds)
+    service = get_service("calendar", "v3")
 
     cal_id = FAMILY_CAL_ID or PRIMARY_CAL_ID
 
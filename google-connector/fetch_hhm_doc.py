@@ -1,9 +1,7 @@
-import json
 from pathlib import Path
 
-import requests
+import hhm_io
 
-BASE = "http://127.0.0.1:9000"
 DOC_NAME = "Happy House Manager"
 
 WORKSPACE_OUT = Path(r"C:\Users\sarah\.openclaw\workspace\HHM_SPEC.txt")
@@ -11,7 +9,7 @@ WORKSPACE_OUT = Path(r"C:\Users\sarah\.openclaw\workspace\HHM_SPEC.txt")
 
 def main():
     print(f"[fetch] Searching Drive for name contains: {DOC_NAME!r}")
-    r = requests.get(f"{BASE}/drive/search", params={"name": DOC_NAME, "max_results": 5})
+    r = hhm_io.get("/drive/search", name=DOC_NAME, max_results=5)
     print("[fetch] search status:", r.status_code)
     if not r.ok:
         print("[fetch] search error:", r.text)
@@ -27,7 +25,7 @@ def main():
     file_name = file.get("name")
     print(f"[fetch] using file id={file_id}, name={file_name!r}")
 
-    r2 = requests.get(f"{BASE}/drive/file/{file_id}")
+    r2 = hhm_io.get(f"/drive/file/{file_id}")
     print("[fetch] file status:", r2.status_code)
     if not r2.ok:
         print("[fetch] file error:", r2.text)
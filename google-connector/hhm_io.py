@@ -0,0 +1,40 @@
+"""Shared HTTP helpers for the fetch_hhm_* scripts.
+
+All scripts go through one module-level Session, so a runner that imports
+several of them reuses the same keep-alive pool to the local connector.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE = "http://127.0.0.1:9000"
+
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+
+def get(path: str, **params) -> requests.Response:
+    """GET a connector endpoint, e.g. get("/drive/search", name="x")."""
+    return SESSION.get(f"{BASE}{path}", params=params, timeout=30)
+
+
+def fetch_and_save(tag: str, path: str, out_path: Path, **params) -> Optional[list]:
+    """GET a JSON endpoint and write the result, indented, to out_path.
+
+    - Logs status/errors prefixed with [tag].
+    - Returns the parsed JSON, or None if the connector returned an error.
+    """
+    resp = get(path, **params)
+    print(f"[{tag}] status:", resp.status_code)
+    if not resp.ok:
+        print(f"[{tag}] error:", resp.text)
+        return None
+
+    data = orjson.loads(resp.content)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    return data
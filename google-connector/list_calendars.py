@@ -1,10 +1,8 @@
-from googleapiclient.discovery import build
-from main import get_credentials
+from main import get_service
 
 
 def main():
-    creds = get_credentials()
-    service = build("calendar", "v3", credentials=creds)
+    service = get_service("calendar", "v3")
     cal_list = service.calendarList().list().execute()
     for item in cal_list.get("items", []):
         print(f"{item.get('id')}\t{item.get('summary')}")
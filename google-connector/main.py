@@ -11,19 +11,31 @@ Auth flow:
 - First run: we open a browser for you to grant access; tokens are stored in token.json.
 """
 
+import asyncio
+import copy
 import os
+import threading
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 from typing import List, Optional
-from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from datetime import datetime, timedelta, timezone
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+import httplib2
+import requests
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 
 load_dotenv()
 
@@ -42,7 +54,25 @@ SCOPES = [
 PRIMARY_CAL_ID = "primary"
 FAMILY_CAL_ID = "family18346276431992889799@group.calendar.google.com"
 
-app = FastAPI(title="Google Connector", version="0.3.0")
+# Household time zone; used when a calendar response doesn't name one
+LOCAL_TZ = ZoneInfo("America/Los_Angeles")
+
+# Refresh OAuth tokens this long before they actually expire
+REFRESH_MARGIN = timedelta(seconds=60)
+
+# Gmail rejects batches over 100 calls and recommends keeping them to 50
+GMAIL_BATCH_SIZE = 50
+
+app = FastAPI(title="Google Connector", version="0.3.0", default_response_class=ORJSONResponse)
+
+
+# Credentials loaded by get_credentials(), reused across requests
+_creds: Optional[Credentials] = None
+_creds_lock = threading.Lock()
+
+# Token refresh transport; one session keeps the connection to Google's token
+# endpoint alive. Refreshes are serialized by _creds_lock.
+_AUTH_REQUEST = Request(session=requests.Session())
 
 
 class CalendarEvent(BaseModel):
@@ -75,26 +105,31 @@ class DriveFileContent(BaseModel):
     content: str
 
 
-def get_credentials() -> Credentials:
-    """Load or create OAuth credentials.
+def _is_fresh(creds: Optional[Credentials]) -> bool:
+    """True if creds are valid and not within REFRESH_MARGIN of expiring."""
+    if not creds or not creds.valid:
+        return False
+    if creds.expiry is None:
+        return True
+    # google-auth stores expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now > REFRESH_MARGIN
 
-    - Requires credentials.json (OAuth client) to exist in APP_DIR.
-    - Stores/refreshes token.json.
-    """
+
+def _load_or_refresh(creds: Optional[Credentials]) -> Credentials:
     if not CREDENTIALS_FILE.exists():
         raise RuntimeError(
             f"Missing {CREDENTIALS_FILE}. Please download your OAuth client file "
             "from Google Cloud Console and save it as credentials.json here."
         )
 
-    creds: Optional[Credentials] = None
-
-    if TOKEN_FILE.exists():
+    if creds is None and TOKEN_FILE.exists():
         creds = Credentials.from_authorized_user_file(str(TOKEN_FILE), SCOPES)
 
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
+    if not _is_fresh(creds):
+        old_token = creds.token if creds else None
+        if creds and creds.refresh_token:
+            creds.refresh(_AUTH_REQUEST)
         else:
             flow = InstalledAppFlow.from_client_secrets_file(
                 str(CREDENTIALS_FILE), SCOPES
@@ -102,11 +137,187 @@ def get_credentials() -> Credentials:
             # This will open a browser window the first time
             creds = flow.run_local_server(port=0)
 
-        TOKEN_FILE.write_text(creds.to_json())
+        if creds.token != old_token:
+            TOKEN_FILE.write_text(creds.to_json())
 
     return creds
 
 
+def _require_worker_thread() -> None:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return  # no loop in this thread: a worker thread or a CLI script
+    raise RuntimeError(
+        "get_credentials() called on the event loop; wrap the Google call in "
+        "asyncio.to_thread"
+    )
+
+
+def get_credentials() -> Credentials:
+    """Load or create OAuth credentials.
+
+    - Requires credentials.json (OAuth client) to exist in APP_DIR.
+    - Stores/refreshes token.json.
+    - Reuses the loaded credentials until they are close to expiry.
+    - Concurrent callers share a single refresh instead of each hitting Google.
+    - Must not be called on the event loop: it can block on _creds_lock or on
+      a network refresh. Endpoints reach it only via asyncio.to_thread.
+    """
+    global _creds
+
+    _require_worker_thread()
+
+    if _is_fresh(_creds):
+        return _creds
+
+    with _creds_lock:
+        # Another thread may have refreshed while we waited for the lock
+        if not _is_fresh(_creds):
+            _creds = _load_or_refresh(_creds)
+        return _creds
+
+
+_thread_http = threading.local()
+
+
+def _build_request(http, *args, **kwargs):
+    # httplib2.Http is not thread-safe, so each worker thread keeps its own
+    # transport; calls made from the same thread reuse its keep-alive
+    # connections. Going through get_credentials() refreshes near-expiry tokens
+    # once, under its lock, rather than letting each transport refresh on its
+    # own. Requests are therefore built in worker threads only, never on the
+    # event loop.
+    thread_http = getattr(_thread_http, "http", None)
+    if thread_http is None:
+        thread_http = _thread_http.http = httplib2.Http()
+    return HttpRequest(AuthorizedHttp(get_credentials(), http=thread_http), *args, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def _build_service(name: str, version: str):
+    return build(
+        name,
+        version,
+        credentials=get_credentials(),
+        requestBuilder=_build_request,
+        cache_discovery=False,
+    )
+
+
+_service_lock = threading.Lock()
+
+
+def get_service(name: str, version: str):
+    """Return a cached API client, building it on first use."""
+    with _service_lock:
+        return _build_service(name, version)
+
+
+def _server_error(e: Exception) -> HTTPException:
+    """Map an unexpected error to a 500, dropping cached clients on auth failures."""
+    global _creds
+
+    if isinstance(e, HttpError) and e.resp.status == 401:
+        with _service_lock:
+            _build_service.cache_clear()
+        # Even the transport's own refresh-and-retry was rejected. Swap in a
+        # copy without the access token so the next get_credentials() does a
+        # single-flight refresh; in-flight requests keep the old object.
+        with _creds_lock:
+            if _creds is not None:
+                stale = copy.copy(_creds)
+                stale.token = None
+                _creds = stale
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def _start_key(start: Optional[str], tz: ZoneInfo = LOCAL_TZ) -> datetime:
+    """Sort key for an event start (RFC3339 dateTime or all-day date).
+
+    All-day dates are taken as local midnight in tz (the calendar's zone), so
+    they sort after the previous evening's timed events:
+
+    >>> sorted(["2026-10-16", "2026-10-15T19:00:00-07:00"], key=_start_key)
+    ['2026-10-15T19:00:00-07:00', '2026-10-16']
+    """
+    if not start:
+        return datetime.min.replace(tzinfo=timezone.utc)  # push unknown to the top
+    dt = datetime.fromisoformat(start.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    return dt
+
+
+# The helpers below build and execute Google requests, so they must run in a
+# worker thread: building a request can refresh credentials (see _build_request).
+
+
+def _list_calendar_events(max_results: int, now_iso: str) -> List[dict]:
+    """List upcoming events from both calendars in one batch request."""
+    service = get_service("calendar", "v3")
+    results = []
+    errors = []
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            errors.append(exception)
+        else:
+            results.append(response)
+
+    batch = service.new_batch_http_request(callback=_collect)
+    for cal_id in (PRIMARY_CAL_ID, FAMILY_CAL_ID):
+        batch.add(
+            service.events().list(
+                calendarId=cal_id,
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy="startTime",
+                timeMin=now_iso,
+            )
+        )
+    batch.execute()
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def _get_message_batch(service, messages: List[dict], offset: int) -> dict:
+    """Fetch metadata for up to GMAIL_BATCH_SIZE messages in one batch request.
+
+    Returns responses keyed by the message's position in messages, as a str.
+    """
+    fetched = {}
+    errors = []
+
+    def _collect(request_id, response, exception):
+        if exception is not None:
+            errors.append(exception)
+        else:
+            fetched[request_id] = response
+
+    batch = service.new_batch_http_request(callback=_collect)
+    for i, msg_meta in enumerate(messages[offset:offset + GMAIL_BATCH_SIZE], start=offset):
+        batch.add(
+            service.users()
+            .messages()
+            .get(
+                userId="me",
+                id=msg_meta["id"],
+                format="metadata",
+                metadataHeaders=["From", "Subject"],
+                fields="id,threadId,snippet,payload/headers",
+            ),
+            request_id=str(i),
+        )
+    batch.execute()
+
+    if errors:
+        raise errors[0]
+    return fetched
+
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
@@ -116,81 +327,94 @@ async def health():
 async def calendar_next(max_results: int = 10):
     """Return the next upcoming events from primary + Family calendars."""
     try:
-        creds = get_credentials()
-        service = build("calendar", "v3", credentials=creds)
-
         now_iso = datetime.now(timezone.utc).isoformat()
 
-        events: List[CalendarEvent] = []
-
-        for cal_id in (PRIMARY_CAL_ID, FAMILY_CAL_ID):
-            events_result = (
-                service.events()
-                .list(
-                    calendarId=cal_id,
-                    maxResults=max_results,
-                    singleEvents=True,
-                    orderBy="startTime",
-                    timeMin=now_iso,
-                )
-                .execute()
-            )
+        results = await asyncio.to_thread(_list_calendar_events, max_results, now_iso)
+
+        # Events mirrored onto both calendars are kept once. Each event is
+        # paired with its parsed start in the same pass for the sort below.
+        keyed = []
+        seen = set()
+
+        for events_result in results:
             items = events_result.get("items", [])
+            cal_tz_name = events_result.get("timeZone")
+            cal_tz = ZoneInfo(cal_tz_name) if cal_tz_name else LOCAL_TZ
 
             for item in items:
-                start = item.get("start", {}).get("dateTime") or item.get("start", {}).get("date")
-                end = item.get("end", {}).get("dateTime") or item.get("end", {}).get("date")
-                events.append(
-                    CalendarEvent(
-                        start=start,
-                        end=end,
-                        summary=item.get("summary"),
-                        description=item.get("description"),
-                        location=item.get("location"),
-                    )
+                start_info = item.get("start") or {}
+                end_info = item.get("end") or {}
+                start = start_info.get("dateTime") or start_info.get("date")
+                end = end_info.get("dateTime") or end_info.get("date")
+                summary = item.get("summary")
+
+                # Compare parsed starts: each calendar formats dateTime in its
+                # own zone, so one instant can appear as different strings.
+                start_key = _start_key(start, cal_tz)
+
+                # A mirrored event has the same iCalUID on both calendars. Fall
+                # back to (start, summary) without a UID, and never merge
+                # untitled (e.g. free/busy-only) events on that fallback.
+                uid = item.get("iCalUID")
+                if uid:
+                    dedupe_key = (uid, start_key)
+                elif summary is not None:
+                    dedupe_key = (start_key, summary)
+                else:
+                    dedupe_key = None
+                if dedupe_key is not None:
+                    if dedupe_key in seen:
+                        continue
+                    seen.add(dedupe_key)
+
+                # model_construct skips validation: the fields come straight from
+                # Google's typed API response, so only pass keys from its schema.
+                event = CalendarEvent.model_construct(
+                    start=start,
+                    end=end,
+                    summary=summary,
+                    description=item.get("description"),
+                    location=item.get("location"),
                 )
+                keyed.append((start_key, event))
 
         # Sort combined events by start time
-        def parse_dt(s: Optional[str]):
-            if not s:
-                return ""  # push all-day/unknown to the top
-            return s
-
-        events.sort(key=lambda e: parse_dt(e.start))
-        return events
+        keyed.sort(key=itemgetter(0))
+        return [e for _, e in keyed]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _server_error(e)
 
 
 @app.get("/gmail/unread", response_model=List[GmailMessage])
 async def gmail_unread(max_results: int = 10):
     """Return a list of recent unread emails from the primary inbox."""
     try:
-        creds = get_credentials()
-        service = build("gmail", "v1", credentials=creds)
+        service = await asyncio.to_thread(get_service, "gmail", "v1")
 
         # List unread messages in INBOX
-        results = (
-            service.users()
+        results = await asyncio.to_thread(
+            lambda: service.users()
             .messages()
             .list(userId="me", labelIds=["INBOX"], q="is:unread", maxResults=max_results)
             .execute()
         )
         messages = results.get("messages", [])
 
-        out: List[GmailMessage] = []
+        # Batches run one after another: a full batch of messages.get calls
+        # already uses about a second of Gmail's per-user quota (250 units/s,
+        # 5 units per get), so sending them in parallel triggers 429s.
+        fetched = {}
+        for offset in range(0, len(messages), GMAIL_BATCH_SIZE):
+            fetched.update(await asyncio.to_thread(_get_message_batch, service, messages, offset))
 
-        for msg_meta in messages:
-            msg = (
-                service.users()
-                .messages()
-                .get(userId="me", id=msg_meta["id"], format="metadata", metadataHeaders=["From", "Subject"])
-                .execute()
-            )
+        out: List[GmailMessage] = []
 
+        for i in range(len(messages)):
+            msg = fetched[str(i)]
             headers = {h["name"].lower(): h["value"] for h in msg.get("payload", {}).get("headers", [])}
+            # Trusted Google payload; see the model_construct note in calendar_next
             out.append(
-                GmailMessage(
+                GmailMessage.model_construct(
                     id=msg.get("id"),
                     threadId=msg.get("threadId"),
                     sender=headers.get("from"),
@@ -201,18 +425,17 @@ async def gmail_unread(max_results: int = 10):
 
         return out
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _server_error(e)
 
 
 @app.get("/drive/recent", response_model=List[DriveFile])
 async def drive_recent(max_results: int = 20):
     """Return a list of recently modified files in Drive."""
     try:
-        creds = get_credentials()
-        service = build("drive", "v3", credentials=creds)
+        service = await asyncio.to_thread(get_service, "drive", "v3")
 
-        results = (
-            service.files()
+        results = await asyncio.to_thread(
+            lambda: service.files()
             .list(
                 pageSize=max_results,
                 fields="files(id, name, mimeType, modifiedTime)",
@@ -225,8 +448,9 @@ async def drive_recent(max_results: int = 20):
 
         out: List[DriveFile] = []
         for f in files:
+            # Trusted Google payload; see the model_construct note in calendar_next
             out.append(
-                DriveFile(
+                DriveFile.model_construct(
                     id=f.get("id"),
                     name=f.get("name"),
                     mimeType=f.get("mimeType"),
@@ -236,21 +460,26 @@ async def drive_recent(max_results: int = 20):
 
         return out
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _server_error(e)
 
 
 @app.get("/drive/search", response_model=List[DriveFile])
-async def drive_search(name: str, max_results: int = 10):
-    """Search Drive files by name (simple contains match)."""
+async def drive_search(name: str, max_results: int = 10, exact: bool = False):
+    """Search Drive files by name.
+
+    - Default: name contains match.
+    - exact=true: exact name match, which Drive can answer from its name index.
+    """
     try:
-        creds = get_credentials()
-        service = build("drive", "v3", credentials=creds)
+        service = await asyncio.to_thread(get_service, "drive", "v3")
 
-        # Simple name contains query; case-insensitive behavior depends on Drive
-        query = f"name contains '{name}' and trashed = false"
+        # Case-insensitive behavior of contains depends on Drive
+        safe_name = name.replace("\\", "\\\\").replace("'", "\\'")
+        op = "=" if exact else "contains"
+        query = f"name {op} '{safe_name}' and trashed = false"
 
-        results = (
-            service.files()
+        results = await asyncio.to_thread(
+            lambda: service.files()
             .list(
                 pageSize=max_results,
                 fields="files(id, name, mimeType, modifiedTime)",
@@ -263,8 +492,9 @@ async def drive_search(name: str, max_results: int = 10):
 
         out: List[DriveFile] = []
         for f in files:
+            # Trusted Google payload; see the model_construct note in calendar_next
             out.append(
-                DriveFile(
+                DriveFile.model_construct(
                     id=f.get("id"),
                     name=f.get("name"),
                     mimeType=f.get("mimeType"),
@@ -274,7 +504,7 @@ async def drive_search(name: str, max_results: int = 10):
 
         return out
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _server_error(e)
 
 
 @app.get("/drive/file/{file_id}", response_model=DriveFileContent)
@@ -285,18 +515,17 @@ async def drive_file_content(file_id: str):
     - For other file types: returns an error.
     """
     try:
-        creds = get_credentials()
-        service = build("drive", "v3", credentials=creds)
+        service = await asyncio.to_thread(get_service, "drive", "v3")
 
-        meta = service.files().get(fileId=file_id, fields="id, name, mimeType").execute()
+        meta = await asyncio.to_thread(
+            lambda: service.files().get(fileId=file_id, fields="id, name, mimeType").execute()
+        )
         mime = meta.get("mimeType")
 
         if mime == "application/vnd.google-apps.document":
             # Export Google Docs as plain text
-            data = (
-                service.files()
-                .export(fileId=file_id, mimeType="text/plain")
-                .execute()
+            data = await asyncio.to_thread(
+                lambda: service.files().export(fileId=file_id, mimeType="text/plain").execute()
             )
             # data is bytes
             if isinstance(data, bytes):
@@ -318,15 +547,29 @@ async def drive_file_content(file_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise _server_error(e)
 
 
 if __name__ == "__main__":
     import uvicorn
 
+    # HHM_DEV=1 runs the auto-reloading dev server. "auto" picks
+    # uvloop/httptools when installed (they ship with uvicorn[standard],
+    # except uvloop on Windows).
+    #
+    # One worker by default: credentials, the refresh lock and the client
+    # cache are per process. HHM_WORKERS>1 is opt-in; those processes share
+    # token.json and refresh independently, so create token.json (first
+    # browser sign-in) with a single worker before raising it.
+    dev = os.getenv("HHM_DEV") == "1"
+    workers = 1 if dev else int(os.getenv("HHM_WORKERS", "1"))
+
     uvicorn.run(
         "main:app",
         host="127.0.0.1",
         port=9000,
-        reload=True,
+        loop="auto",
+        http="auto",
+        reload=dev,
+        workers=workers,
     )